@@ -9,6 +9,15 @@ import os
 
 # NOTE: Core weather logic has been extracted to `weather_service.py` for reuse by web app.
 
+
+def now_str():
+    """
+    Текущее время в формате ГГГГ-ММ-ДД ЧЧ:ММ:СС (f-строка быстрее strftime)
+    """
+    t = datetime.now()
+    return f"{t.year:04d}-{t.month:02d}-{t.day:02d} {t.hour:02d}:{t.minute:02d}:{t.second:02d}"
+
+
 class WeatherParser:
     def __init__(self, api_key=None):
         """
@@ -77,7 +86,7 @@ class WeatherParser:
             'humidity': 65,
             'pressure': 1013,
             'wind_speed': 3.2,
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            'timestamp': now_str()
         }
         return mock_data
     
@@ -94,7 +103,7 @@ class WeatherParser:
             'humidity': data['main']['humidity'],
             'pressure': data['main']['pressure'],
             'wind_speed': data['wind']['speed'],
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            'timestamp': now_str()
         }
         return formatted
     
@@ -1,47 +1,247 @@
-from fastapi import FastAPI, Request
+import asyncio
+import hashlib
+import logging
+import os
+import stat
+from contextlib import asynccontextmanager
+from urllib.parse import parse_qs
+
+import anyio
+import orjson
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.responses import HTMLResponse
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from typing import Optional
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+from starlette.datastructures import Headers
+from starlette.types import Scope
+from typing import Any, AsyncIterator, Dict, Optional, Union
+
+from weather_service import WeatherService, create_http_client, get_location_by_ip
+
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = "app/static"
+TEMPLATES_DIR = "app/templates"
+# Режим разработки (DEBUG=1): шаблоны перечитываются при изменении и не пререндерятся
+DEBUG = os.getenv("DEBUG", "").lower() in ("1", "true", "yes")
+
+
+def encoding_qualities(accept_encoding: str) -> Dict[str, float]:
+    """Разобрать Accept-Encoding в словарь кодировка -> q (q=0 означает «не принимать»)."""
+    qualities: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        token, *params = [part.strip() for part in item.split(";")]
+        if not token:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[token.lower()] = quality
+    return qualities
+
+
+class CachedStaticFiles(StaticFiles):
+    """
+    Статика с долгим кэшированием для версионированных URL (?v=...)
+    и отдачей заранее сжатых вариантов (styles.css.br / styles.css.gz), если они есть.
+    """
+
+    PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        response = None
+        # Остальные методы отдаём базовому классу: он ответит 405
+        if scope["method"] in ("GET", "HEAD"):
+            response = await self._get_precompressed_response(path, scope)
+        if response is None:
+            response = await super().get_response(path, scope)
+        if response.status_code in (200, 304):
+            response.headers["Vary"] = "Accept-Encoding"
+            query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+            if query.get("v", [""])[0]:
+                response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
+    async def _get_precompressed_response(self, path: str, scope: Scope) -> Optional[Response]:
+        qualities = encoding_qualities(Headers(scope=scope).get("accept-encoding", ""))
+        for encoding, suffix in self.PRECOMPRESSED:
+            if qualities.get(encoding, qualities.get("*", 0.0)) <= 0:
+                continue
+            full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + suffix)
+            if stat_result and stat.S_ISREG(stat_result.st_mode):
+                # Тип содержимого берётся по исходному имени: styles.css.br -> text/css
+                response = self.file_response(full_path, stat_result, scope)
+                response.headers["Content-Encoding"] = encoding
+                return response
+        return None
 
-from weather_service import WeatherService, get_location_by_ip
+
+def content_version(directory: str) -> str:
+    """Хэш содержимого каталога: меняется при любой правке файлов и сбрасывает кэш браузера."""
+    digest = hashlib.blake2b(digest_size=8)
+    for root, _dirs, files in sorted(os.walk(directory)):
+        for name in sorted(files):
+            with open(os.path.join(root, name), "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+# Скомпилированные шаблоны кэшируются на диске; вне DEBUG проверка mtime
+# при каждом рендере отключена (после правки шаблонов нужен перезапуск)
+templates = Jinja2Templates(
+    env=Environment(
+        loader=FileSystemLoader(TEMPLATES_DIR),
+        bytecode_cache=FileSystemBytecodeCache(),
+        auto_reload=DEBUG,
+        cache_size=400,
+        autoescape=True,
+    )
+)
+templates.env.globals["static_version"] = content_version(STATIC_DIR)
+# Версия разметки для ETag страницы: после деплоя с новыми шаблонами или статикой
+# браузер не должен получать 304 на старый HTML
+PAGE_VERSION = content_version(TEMPLATES_DIR) + templates.env.globals["static_version"]
 
 
-app = FastAPI(title="Weather Parser Web")
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    # Один HTTP-клиент и один сервис на процесс: пул соединений и окружение
+    # переиспользуются между запросами
+    async with create_http_client() as http_client:
+        app.state.http_client = http_client
+        app.state.service = WeatherService(client=http_client)
+        # Пустая страница (без запроса и без погоды) не зависит от контекста:
+        # рендерим её один раз и отдаём готовые байты
+        app.state.empty_index = None
+        if not DEBUG:
+            app.state.empty_index = (
+                templates.get_template("index.html")
+                .render(weather=None, query="")
+                .encode("utf-8")
+            )
+        yield
 
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
-templates = Jinja2Templates(directory="app/templates")
+
+app = FastAPI(
+    title="Weather Parser Web", default_response_class=ORJSONResponse, lifespan=lifespan
+)
+app.mount("/static", CachedStaticFiles(directory=STATIC_DIR), name="static")
+
+
+def get_service(request: Request) -> WeatherService:
+    return request.app.state.service
+
+
+# Погода меняется за минуты: браузер/прокси могут отдавать ответ сами
+WEATHER_CACHE_CONTROL = "public, max-age=60, stale-while-revalidate=300"
+
+# Ошибки JSON API отдаются в одном формате: {"detail": ...}, как у HTTPException
+WEATHER_UNAVAILABLE = "Не удалось получить данные"
+
+
+def make_etag(data: Any) -> str:
+    return '"%s"' % hashlib.blake2b(orjson.dumps(data), digest_size=8).hexdigest()
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates or "*" in candidates
 
 
 @app.get("/", response_class=HTMLResponse)
-async def index(request: Request, q: Optional[str] = None) -> HTMLResponse:
-    service = WeatherService()
+async def index(request: Request, q: Optional[str] = None) -> Response:
+    service = get_service(request)
     weather = None
 
     if q:
-        weather = service.get_weather_by_city(q)
+        weather = await service.get_weather_by_city(q)
     else:
-        loc = get_location_by_ip()
+        loc = await get_location_by_ip(request.app.state.http_client)
         if loc and (loc.get("lat") is not None and loc.get("lon") is not None):
-            weather = service.get_weather_by_coords(loc["lat"], loc["lon"], fallback_city=loc.get("city"))
+            weather = await service.get_weather_by_coords(
+                loc["lat"], loc["lon"], fallback_city=loc.get("city")
+            )
+
+    if not q and weather is None and request.app.state.empty_index is not None:
+        return HTMLResponse(content=request.app.state.empty_index)
+
+    # Кэшируем только явные запросы: ответ по IP у каждого клиента свой
+    headers = None
+    if q and weather:
+        etag = make_etag({"version": PAGE_VERSION, "query": q, "weather": weather})
+        headers = {"Cache-Control": WEATHER_CACHE_CONTROL, "ETag": etag}
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
 
     return templates.TemplateResponse(
         "index.html",
         {"request": request, "weather": weather, "query": q or ""},
+        headers=headers,
     )
 
 
-@app.get("/api/weather", response_class=JSONResponse)
-async def api_weather(city: str) -> JSONResponse:
+@app.get("/api/weather", response_model=None)
+async def api_weather(
+    request: Request, response: Response, city: str
+) -> Union[Dict[str, Any], Response]:
     """
     JSON API: получить погоду по городу
     Пример: /api/weather?city=Москва
     """
-    service = WeatherService()
-    data = service.get_weather_by_city(city)
+    service = get_service(request)
+    data = await service.get_weather_by_city(city)
     if not data:
-        return JSONResponse({"error": "Не удалось получить данные"}, status_code=502)
-    return JSONResponse(data)
+        raise HTTPException(status_code=502, detail=WEATHER_UNAVAILABLE)
+    etag = make_etag(data)
+    headers = {"Cache-Control": WEATHER_CACHE_CONTROL, "ETag": etag}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return data
+
 
+# Ограничение на число городов в одном запросе. Частоту запросов к геокодеру
+# Nominatim (~1 в секунду) сервис ограничивает сам, так что промахи геокодера
+# из одного запроса выполняются по очереди, а не разом
+MULTI_MAX_CITIES = 10
 
+
+@app.get("/api/weather/multi")
+async def api_weather_multi(request: Request, cities: str) -> Dict[str, Any]:
+    """
+    JSON API: погода сразу для нескольких городов (запросы идут параллельно)
+    Пример: /api/weather/multi?cities=Москва,спб
+    """
+    service = get_service(request)
+    # Повторы (без учёта регистра) запрашиваем один раз
+    unique: Dict[str, str] = {}
+    for name in cities.split(","):
+        name = name.strip()
+        if name:
+            unique.setdefault(name.lower(), name)
+    names = list(unique.values())
+    if len(names) > MULTI_MAX_CITIES:
+        raise HTTPException(
+            status_code=400, detail=f"Не более {MULTI_MAX_CITIES} городов за запрос"
+        )
+    results = await asyncio.gather(
+        *(service.get_weather_by_city(name) for name in names), return_exceptions=True
+    )
+    response: Dict[str, Any] = {}
+    for name, data in zip(names, results):
+        if isinstance(data, BaseException):
+            logger.error("Ошибка получения погоды для %r", name, exc_info=data)
+            data = None
+        response[name] = data or {"detail": WEATHER_UNAVAILABLE}
+    return response
@@ -1,10 +1,342 @@
+import asyncio
+import hashlib
 import os
-from datetime import datetime
-from typing import Any, Dict, Optional
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Awaitable, ClassVar, Dict, Hashable, Optional, Tuple
 
-import requests
+import httpx
 from dotenv import load_dotenv
 
+try:
+    # orjson разбирает UTF-8 байты напрямую и заметно быстрее stdlib json
+    from orjson import loads as _json_loads
+except ImportError:  # pragma: no cover - запасной вариант без orjson
+    from json import loads as _json_loads
+
+
+# Подхватим переменные окружения из .env один раз при импорте модуля
+# (безошибочно, если файла нет)
+load_dotenv()
+_OWM_KEY = os.getenv("OPENWEATHER_API_KEY")
+_YANDEX_KEY = os.getenv("YANDEX_WEATHER_API_KEY")
+
+# 1 мм рт. ст. в гектопаскалях
+MMHG_TO_HPA = 1.33322
+
+
+# Короткий таймаут на соединение и умеренный на чтение: мёртвый провайдер
+# не держит обработчик по 10 секунд
+HTTP_TIMEOUT = httpx.Timeout(5.0, connect=2.0)
+# Повторы: сбои соединения повторяет транспорт, временные 5xx — _get_with_retry
+_RETRY_TOTAL = 2
+_RETRY_BACKOFF = 0.2
+_RETRY_STATUSES = frozenset({500, 502, 503, 504})
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """
+    Общий асинхронный клиент на процесс: пул keep-alive соединений к провайдерам
+    вместо установки TCP/TLS на каждый запрос.
+    """
+    return httpx.AsyncClient(
+        timeout=HTTP_TIMEOUT,
+        transport=httpx.AsyncHTTPTransport(
+            retries=_RETRY_TOTAL,
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=32),
+        ),
+    )
+
+
+# Минимальный интервал между сетевыми запросами к хосту: политика Nominatim
+# допускает не больше ~1 запроса в секунду (ограничение действует в пределах процесса)
+HOST_MIN_INTERVAL: Dict[str, float] = {"nominatim.openstreetmap.org": 1.0}
+# Хост -> ближайший свободный момент (time.monotonic()) для следующего запроса
+_host_next_slot: Dict[str, float] = {}
+
+
+async def _wait_for_host_slot(url: str) -> None:
+    """Дождаться своей очереди к хосту с ограничением частоты запросов."""
+    host = httpx.URL(url).host
+    interval = HOST_MIN_INTERVAL.get(host)
+    if not interval:
+        return
+    # Слот резервируется без await между чтением и записью, поэтому
+    # параллельные корутины выстраиваются в очередь без блокировки
+    now = time.monotonic()
+    slot = max(now, _host_next_slot.get(host, now))
+    _host_next_slot[host] = slot + interval
+    if slot > now:
+        await asyncio.sleep(slot - now)
+
+
+async def _get_with_retry(client: httpx.AsyncClient, url: str, **kwargs: Any) -> httpx.Response:
+    """GET с повтором и экспоненциальной паузой на временных ошибках сервера."""
+    for attempt in range(_RETRY_TOTAL):
+        await _wait_for_host_slot(url)
+        response = await client.get(url, **kwargs)
+        if response.status_code not in _RETRY_STATUSES:
+            return response
+        await asyncio.sleep(_RETRY_BACKOFF * 2 ** attempt)
+    await _wait_for_host_slot(url)
+    return await client.get(url, **kwargs)
+
+
+# Время жизни записей кэша (секунды): погода меняется за минуты,
+# а координаты города практически статичны
+WEATHER_CACHE_TTL = 30.0
+GEOCODE_CACHE_TTL = 24 * 60 * 60.0
+# Сколько просроченная запись ещё годится как запасной ответ при сбое провайдера
+WEATHER_STALE_MAX_AGE = 10 * 60.0
+GEOCODE_STALE_MAX_AGE = 7 * 24 * 60 * 60.0
+_CACHE_MAXSIZE = 1024
+
+# Постоянный HTTP-кэш на диске (общий для воркеров через SQLite). Свежесть погоды
+# задаёт WEATHER_CACHE_TTL для обоих слоёв; геокодирование Nominatim хранится месяц
+# (координаты не меняются, а запросы ограничены), местоположение по IP — час.
+# Отключается переменной окружения WEATHER_HTTP_CACHE=0, путь — WEATHER_HTTP_CACHE_PATH
+HTTP_CACHE_ENABLED = os.getenv("WEATHER_HTTP_CACHE", "1").lower() not in ("0", "false", "no")
+HTTP_CACHE_PATH = os.getenv("WEATHER_HTTP_CACHE_PATH") or os.path.join(
+    os.path.expanduser("~"), ".cache", "weather-parser", "http_cache.sqlite"
+)
+HTTP_CACHE_EXPIRE = WEATHER_CACHE_TTL
+HTTP_CACHE_EXPIRE_BY_HOST: Dict[str, float] = {
+    "nominatim.openstreetmap.org": 30 * 24 * 60 * 60.0,
+    "ip-api.com": 60 * 60.0,
+}
+# Просроченные записи удаляются при записи, но не чаще раза в HTTP_CACHE_PURGE_INTERVAL
+HTTP_CACHE_PURGE_INTERVAL = 10 * 60.0
+_http_cache_db: Optional[sqlite3.Connection] = None
+# Не удалось открыть файл кэша (например, домашний каталог только для чтения) —
+# больше не пытаемся до перезапуска процесса
+_http_cache_failed = False
+_http_cache_purged_at = float("-inf")
+# Соединение одно на процесс, а запросы идут из пула потоков — сериализуем доступ
+_http_cache_lock = threading.Lock()
+
+# Кэш в памяти процесса: ключ -> (момент истечения по time.monotonic(), значение)
+_cache: Dict[Hashable, Tuple[float, Any]] = {}
+
+
+def _cache_get(key: Hashable, max_stale: float = 0.0) -> Optional[Any]:
+    """
+    Вернуть значение из кэша, если оно не устарело.
+    С max_stale > 0 вернёт и просроченное значение, если срок истёк не более
+    max_stale секунд назад (fallback при ошибке сети). Такие данные о погоде
+    помечаются источником "<source>_stale".
+    """
+    entry = _cache.get(key)
+    if entry is None:
+        return None
+    expires_at, value = entry
+    now = time.monotonic()
+    if expires_at > now:
+        return value
+    if max_stale and expires_at + max_stale > now:
+        if isinstance(value, dict) and "source" in value:
+            return {**value, "source": value["source"] + "_stale"}
+        return value
+    return None
+
+
+def _cache_set(key: Hashable, value: Any, ttl: float) -> None:
+    if key not in _cache and len(_cache) >= _CACHE_MAXSIZE:
+        # Вытесняем самую старую запись (dict сохраняет порядок вставки)
+        del _cache[next(iter(_cache))]
+    _cache[key] = (time.monotonic() + ttl, value)
+
+
+def _http_cache_conn() -> Optional[sqlite3.Connection]:
+    global _http_cache_db, _http_cache_failed
+    if _http_cache_db is None and HTTP_CACHE_ENABLED and not _http_cache_failed:
+        try:
+            os.makedirs(os.path.dirname(HTTP_CACHE_PATH), exist_ok=True)
+            conn = sqlite3.connect(
+                HTTP_CACHE_PATH, timeout=1.0, isolation_level=None, check_same_thread=False
+            )
+            # WAL: читатели не ждут писателя, воркеры не блокируют друг друга
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            # Старая схема без fetched_at больше не используется
+            conn.execute("DROP TABLE IF EXISTS responses")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS http_responses (key TEXT PRIMARY KEY,"
+                " fetched_at REAL NOT NULL, expires_at REAL NOT NULL, body BLOB NOT NULL)"
+            )
+        except (OSError, sqlite3.Error):
+            # Кэш — лишь оптимизация: без него просто ходим в сеть
+            _http_cache_failed = True
+            return None
+        _http_cache_db = conn
+    return _http_cache_db
+
+
+# Функции ниже блокируют поток (диск, ожидание блокировки SQLite),
+# поэтому вызываются только через asyncio.to_thread
+def _http_cache_read(key: str) -> Optional[Tuple[bytes, float]]:
+    """Вернуть (тело ответа, время его получения) или None."""
+    with _http_cache_lock:
+        conn = _http_cache_conn()
+        if conn is None:
+            return None
+        try:
+            row = conn.execute(
+                "SELECT body, fetched_at FROM http_responses WHERE key = ? AND expires_at > ?",
+                (key, time.time()),
+            ).fetchone()
+        except sqlite3.Error:
+            return None
+    return (row[0], row[1]) if row is not None else None
+
+
+def _http_cache_write(key: str, body: bytes, fetched_at: float, expire_after: float) -> None:
+    global _http_cache_purged_at
+    with _http_cache_lock:
+        conn = _http_cache_conn()
+        if conn is None:
+            return
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO http_responses (key, fetched_at, expires_at, body)"
+                " VALUES (?, ?, ?, ?)",
+                (key, fetched_at, fetched_at + expire_after, body),
+            )
+            if time.monotonic() - _http_cache_purged_at > HTTP_CACHE_PURGE_INTERVAL:
+                conn.execute("DELETE FROM http_responses WHERE expires_at <= ?", (time.time(),))
+                _http_cache_purged_at = time.monotonic()
+        except sqlite3.Error:
+            pass
+
+
+async def _fetch_json_timed(
+    client: httpx.AsyncClient,
+    url: str,
+    params: Optional[Dict[str, Any]] = None,
+    headers: Optional[Dict[str, str]] = None,
+) -> Optional[Tuple[Any, float]]:
+    """
+    Единая точка запроса к провайдерам: постоянный HTTP-кэш, повторы, проверка
+    статуса и разбор JSON. В кэш (SQLite, срок зависит от хоста) попадают только
+    успешно разобранные ответы. Возвращает (данные, время получения ответа от
+    провайдера по time.time()) или None при ошибке сети, HTTP-статусе ошибки
+    или невалидном JSON.
+    """
+    request_url = httpx.URL(url)
+    if params:
+        request_url = request_url.copy_merge_params(params)
+    key = hashlib.blake2b(str(request_url).encode("utf-8"), digest_size=16).hexdigest()
+    if HTTP_CACHE_ENABLED:
+        cached = await asyncio.to_thread(_http_cache_read, key)
+        if cached is not None:
+            body, fetched_at = cached
+            try:
+                return _json_loads(body), fetched_at
+            except ValueError:
+                pass  # повреждённая запись — просто перезапросим
+
+    try:
+        response = await _get_with_retry(client, url, params=params, headers=headers)
+        response.raise_for_status()
+        data = _json_loads(response.content)
+    except (httpx.HTTPError, ValueError):
+        return None
+    fetched_at = time.time()
+    if HTTP_CACHE_ENABLED and response.status_code == 200:
+        # Пустые ответы (например, [] от Nominatim для несуществующего города)
+        # храним недолго, чтобы мусорные запросы не копились на месяц
+        expire_after = HTTP_CACHE_EXPIRE
+        if data:
+            expire_after = HTTP_CACHE_EXPIRE_BY_HOST.get(request_url.host, HTTP_CACHE_EXPIRE)
+        await asyncio.to_thread(
+            _http_cache_write, key, response.content, fetched_at, expire_after
+        )
+    return data, fetched_at
+
+
+async def _fetch_json(
+    client: httpx.AsyncClient,
+    url: str,
+    params: Optional[Dict[str, Any]] = None,
+    headers: Optional[Dict[str, str]] = None,
+) -> Optional[Any]:
+    """То же, что _fetch_json_timed, но только данные."""
+    result = await _fetch_json_timed(client, url, params=params, headers=headers)
+    return result[0] if result is not None else None
+
+
+# Отформатированное время последней секунды: ответы в пределах одной секунды
+# переиспользуют строку вместо повторного strftime
+_now_cache: Tuple[int, str] = (-1, "")
+
+
+def _time_str(timestamp: float) -> str:
+    global _now_cache
+    now = int(timestamp)
+    if now != _now_cache[0]:
+        # f-строка быстрее strftime: без разбора формата и учёта локали
+        t = time.localtime(now)
+        _now_cache = (
+            now,
+            f"{t.tm_year:04d}-{t.tm_mon:02d}-{t.tm_mday:02d} "
+            f"{t.tm_hour:02d}:{t.tm_min:02d}:{t.tm_sec:02d}",
+        )
+    return _now_cache[1]
+
+
+def _now_str() -> str:
+    return _time_str(time.time())
+
+
+def _is_stale(result: Any) -> bool:
+    return isinstance(result, dict) and str(result.get("source", "")).endswith("_stale")
+
+
+async def _first_result(*coros: Awaitable[Optional[Any]]) -> Optional[Any]:
+    """
+    Запустить корутины параллельно и вернуть первый непустой результат.
+    Исключение в одной из задач считается пустым результатом; оно пробрасывается,
+    только если упали все задачи. Устаревшие ("*_stale") данные уступают живым:
+    они возвращаются, только если живого ответа так и не пришло. Из завершившихся
+    одновременно задач приоритет у стоящей раньше в списке. Оставшиеся задачи
+    отменяются.
+    """
+    tasks = [asyncio.ensure_future(coro) for coro in coros]
+    errors = []
+    fallback = None
+    try:
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            live = None
+            # Забираем результат/исключение у каждой завершившейся задачи, иначе
+            # asyncio напишет в лог "Task exception was never retrieved"
+            for task in tasks:
+                if task not in done:
+                    continue
+                error = task.exception()
+                if error is not None:
+                    errors.append(error)
+                    continue
+                result = task.result()
+                if not result:
+                    continue
+                if _is_stale(result):
+                    fallback = fallback or result
+                elif live is None:
+                    live = result
+            if live is not None:
+                return live
+        if fallback is not None:
+            return fallback
+        if errors and len(errors) == len(tasks):
+            raise errors[0]
+        return None
+    finally:
+        for task in tasks:
+            task.cancel()
+
 
 class WeatherService:
     """
@@ -12,34 +344,79 @@ class WeatherService:
     Выносит логику из консольного приложения для переиспользования в вебе.
     """
 
-    def __init__(self, api_key: Optional[str] = None) -> None:
-        # Подхватим переменные окружения из .env при инициализации сервиса
-        # (безошибочно, если файла нет)
-        load_dotenv()
-        self.api_key = api_key or os.getenv("OPENWEATHER_API_KEY")
-        self.yandex_api_key = os.getenv("YANDEX_WEATHER_API_KEY")
-        self.base_url = "http://api.openweathermap.org/data/2.5/weather"
-        self.yandex_url = "https://api.weather.yandex.ru/v2/forecast"
-        # Частые алиасы/сокращения городов (ключи в нижнем регистре)
-        self.city_aliases: Dict[str, str] = {
-            "спб": "Санкт-Петербург",
-            "spb": "Санкт-Петербург",
-            "питер": "Санкт-Петербург",
-            "ленинград": "Санкт-Петербург",
-            "мск": "Москва",
-            "msk": "Москва",
-            "москва": "Москва",
-        }
+    BASE_URL: ClassVar[str] = "http://api.openweathermap.org/data/2.5/weather"
+    YANDEX_URL: ClassVar[str] = "https://api.weather.yandex.ru/v2/forecast"
+    # Частые алиасы/сокращения городов (ключи в нижнем регистре)
+    CITY_ALIASES: ClassVar[Dict[str, str]] = {
+        "спб": "Санкт-Петербург",
+        "spb": "Санкт-Петербург",
+        "питер": "Санкт-Петербург",
+        "ленинград": "Санкт-Петербург",
+        "мск": "Москва",
+        "msk": "Москва",
+        "москва": "Москва",
+    }
+
+    def __init__(
+        self, api_key: Optional[str] = None, client: Optional[httpx.AsyncClient] = None
+    ) -> None:
+        self.api_key = api_key or _OWM_KEY
+        self.yandex_api_key = _YANDEX_KEY
+        # Клиент, созданный самим сервисом, сервис и закрывает (aclose / async with);
+        # переданный снаружи клиент остаётся на совести владельца
+        self._owns_client = client is None
+        self.client = client or create_http_client()
+
+    async def aclose(self) -> None:
+        if self._owns_client:
+            await self.client.aclose()
+
+    async def __aenter__(self) -> "WeatherService":
+        return self
 
-    def get_weather_by_city(self, city_name: str) -> Optional[Dict[str, Any]]:
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+
+    async def get_weather_by_city(self, city_name: str) -> Optional[Dict[str, Any]]:
         city_name = self._normalize_city_name(city_name)
-        # Если есть ключ Яндекс Погоды, используем его как приоритетный провайдер
+        # Если настроены оба провайдера, опрашиваем их параллельно и берём первый ответ
+        if self.yandex_api_key and self.api_key:
+            return await _first_result(
+                self._get_yandex_by_city(city_name),
+                self._get_openweather_by_city(city_name),
+            )
         if self.yandex_api_key:
-            return self._get_yandex_by_city(city_name)
+            return await self._get_yandex_by_city(city_name)
         if not self.api_key:
             data = self._get_weather_mock(city_name)
             data["source"] = "mock"
             return data
+        return await self._get_openweather_by_city(city_name)
+
+    async def get_weather_by_coords(
+        self, latitude: float, longitude: float, fallback_city: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        if self.yandex_api_key and self.api_key:
+            return await _first_result(
+                self._get_yandex_by_coords(latitude, longitude, fallback_city),
+                self._get_openweather_by_coords(latitude, longitude),
+            )
+        if self.yandex_api_key:
+            return await self._get_yandex_by_coords(latitude, longitude, fallback_city)
+        if not self.api_key:
+            data = self._get_weather_mock(fallback_city or "Ваш город")
+            data["source"] = "mock"
+            return data
+        return await self._get_openweather_by_coords(latitude, longitude)
+
+    # --------------------
+    # OpenWeather
+    # --------------------
+    async def _get_openweather_by_city(self, city_name: str) -> Optional[Dict[str, Any]]:
+        cache_key = ("openweather", city_name.lower())
+        cached = _cache_get(cache_key)
+        if cached is not None:
+            return cached
 
         params = {
             "q": city_name,
@@ -47,25 +424,21 @@ class WeatherService:
             "units": "metric",
             "lang": "ru",
         }
-        try:
-            response = requests.get(self.base_url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            formatted = self._format_weather_data(data)
-            formatted["source"] = "live"
-            return formatted
-        except requests.RequestException:
-            return None
+        result = await _fetch_json_timed(self.client, self.BASE_URL, params=params)
+        if result is None:
+            return _cache_get(cache_key, max_stale=WEATHER_STALE_MAX_AGE)
+        formatted = self._format_weather_data(*result)
+        formatted["source"] = "live"
+        _cache_set(cache_key, formatted, WEATHER_CACHE_TTL)
+        return formatted
 
-    def get_weather_by_coords(
-        self, latitude: float, longitude: float, fallback_city: Optional[str] = None
+    async def _get_openweather_by_coords(
+        self, latitude: float, longitude: float
     ) -> Optional[Dict[str, Any]]:
-        if self.yandex_api_key:
-            return self._get_yandex_by_coords(latitude, longitude, fallback_city)
-        if not self.api_key:
-            data = self._get_weather_mock(fallback_city or "Ваш город")
-            data["source"] = "mock"
-            return data
+        cache_key = ("openweather", round(latitude, 2), round(longitude, 2))
+        cached = _cache_get(cache_key)
+        if cached is not None:
+            return cached
 
         params = {
             "lat": latitude,
@@ -74,67 +447,79 @@ class WeatherService:
             "units": "metric",
             "lang": "ru",
         }
-        try:
-            response = requests.get(self.base_url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            formatted = self._format_weather_data(data)
-            formatted["source"] = "live"
-            return formatted
-        except requests.RequestException:
-            return None
+        result = await _fetch_json_timed(self.client, self.BASE_URL, params=params)
+        if result is None:
+            return _cache_get(cache_key, max_stale=WEATHER_STALE_MAX_AGE)
+        formatted = self._format_weather_data(*result)
+        formatted["source"] = "live"
+        _cache_set(cache_key, formatted, WEATHER_CACHE_TTL)
+        return formatted
 
     # --------------------
     # Yandex Weather
     # --------------------
-    def _get_yandex_by_city(self, city_name: str) -> Optional[Dict[str, Any]]:
-        coords = self._geocode_city(city_name)
+    async def _get_yandex_by_city(self, city_name: str) -> Optional[Dict[str, Any]]:
+        coords = await self._geocode_city(city_name)
         if not coords:
             return None
-        return self._get_yandex_by_coords(coords["lat"], coords["lon"], fallback_city=city_name)
+        return await self._get_yandex_by_coords(coords["lat"], coords["lon"], fallback_city=city_name)
 
-    def _get_yandex_by_coords(
+    async def _get_yandex_by_coords(
         self, latitude: float, longitude: float, fallback_city: Optional[str] = None
     ) -> Optional[Dict[str, Any]]:
+        cache_key = ("yandex", round(latitude, 2), round(longitude, 2), fallback_city)
+        cached = _cache_get(cache_key)
+        if cached is not None:
+            return cached
+
         headers = {"X-Yandex-Weather-Key": self.yandex_api_key}
         params = {"lat": latitude, "lon": longitude, "lang": "ru"}
-        try:
-            resp = requests.get(self.yandex_url, headers=headers, params=params, timeout=10)
-            resp.raise_for_status()
-            data = resp.json()
-            formatted = self._format_yandex_data(data, fallback_city)
-            formatted["source"] = "live_yandex"
-            return formatted
-        except requests.RequestException:
-            return None
+        result = await _fetch_json_timed(
+            self.client, self.YANDEX_URL, params=params, headers=headers
+        )
+        if result is None:
+            return _cache_get(cache_key, max_stale=WEATHER_STALE_MAX_AGE)
+        data, fetched_at = result
+        formatted = self._format_yandex_data(data, fallback_city, fetched_at)
+        formatted["source"] = "live_yandex"
+        _cache_set(cache_key, formatted, WEATHER_CACHE_TTL)
+        return formatted
 
-    def _geocode_city(self, city_name: str) -> Optional[Dict[str, float]]:
+    async def _geocode_city(self, city_name: str) -> Optional[Dict[str, float]]:
         city_name = self._normalize_city_name(city_name)
+        cache_key = ("geocode", city_name.lower())
+        cached = _cache_get(cache_key)
+        if cached is not None:
+            return cached
         # Простой геокодер через Nominatim (OSM). Соблюдаем требования — укажем User-Agent.
-        try:
-            resp = requests.get(
-                "https://nominatim.openstreetmap.org/search",
-                params={
-                    "q": city_name,
-                    "format": "json",
-                    "limit": 1,
-                    "accept-language": "ru",
-                },
-                headers={"User-Agent": "weather-parser-app/1.0"},
-                timeout=10,
-            )
-            resp.raise_for_status()
-            items = resp.json()
-            if not items:
-                return None
-            item = items[0]
-            return {"lat": float(item["lat"]), "lon": float(item["lon"])}
-        except requests.RequestException:
+        items = await _fetch_json(
+            self.client,
+            "https://nominatim.openstreetmap.org/search",
+            params={
+                "q": city_name,
+                "format": "json",
+                "limit": 1,
+                "accept-language": "ru",
+            },
+            headers={"User-Agent": "weather-parser-app/1.0"},
+        )
+        if items is None:
+            return _cache_get(cache_key, max_stale=GEOCODE_STALE_MAX_AGE)
+        if not items:
             return None
+        item = items[0]
+        try:
+            coords = {"lat": float(item["lat"]), "lon": float(item["lon"])}
+        except ValueError:
+            return _cache_get(cache_key, max_stale=GEOCODE_STALE_MAX_AGE)
+        _cache_set(cache_key, coords, GEOCODE_CACHE_TTL)
+        return coords
 
-    def _format_yandex_data(self, data: Dict[str, Any], fallback_city: Optional[str]) -> Dict[str, Any]:
-        fact = data.get("fact", {})
-        geo = data.get("geo_object", {})
+    def _format_yandex_data(
+        self, data: Dict[str, Any], fallback_city: Optional[str], fetched_at: float
+    ) -> Dict[str, Any]:
+        fact = data.get("fact") or {}
+        geo = data.get("geo_object") or {}
         locality = (geo.get("locality") or {}).get("name")
         country_name = (geo.get("country") or {}).get("name")
 
@@ -142,8 +527,11 @@ class WeatherService:
         feels_like = fact.get("feels_like")
         description = fact.get("condition", "").replace("-", " ").title()
         humidity = fact.get("humidity")
-        # В API Яндекса давление приходит в мм рт. ст. (pressure_mm)
-        pressure = fact.get("pressure_mm")
+        # Давление отдаём в гПа, как у OpenWeather: Яндекс присылает pressure_pa (гПа)
+        # и pressure_mm (мм рт. ст.)
+        pressure = fact.get("pressure_pa")
+        if pressure is None and fact.get("pressure_mm") is not None:
+            pressure = round(fact["pressure_mm"] * MMHG_TO_HPA)
         wind_speed = fact.get("wind_speed")
 
         return {
@@ -155,26 +543,28 @@ class WeatherService:
             "humidity": humidity,
             "pressure": pressure,
             "wind_speed": wind_speed,
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "timestamp": _time_str(fetched_at),
         }
 
     def _normalize_city_name(self, city_name: str) -> str:
-        if not city_name:
-            return city_name
-        key = city_name.strip().lower()
-        return self.city_aliases.get(key, city_name.strip())
+        return _normalize_city(city_name)
 
-    def _format_weather_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
+    def _format_weather_data(self, data: Dict[str, Any], fetched_at: float) -> Dict[str, Any]:
+        # Вложенные словари достаём один раз, без пустых dict на каждый .get
+        main = data.get("main") or {}
+        sys_info = data.get("sys") or {}
+        wind = data.get("wind") or {}
+        weather0 = (data.get("weather") or ({},))[0]
         return {
             "city": data.get("name"),
-            "country": data.get("sys", {}).get("country"),
-            "temperature": round(data.get("main", {}).get("temp")),
-            "feels_like": round(data.get("main", {}).get("feels_like")),
-            "description": (data.get("weather", [{}])[0].get("description", "").title()),
-            "humidity": data.get("main", {}).get("humidity"),
-            "pressure": data.get("main", {}).get("pressure"),
-            "wind_speed": data.get("wind", {}).get("speed"),
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "country": sys_info.get("country"),
+            "temperature": round(main.get("temp")),
+            "feels_like": round(main.get("feels_like")),
+            "description": weather0.get("description", "").title(),
+            "humidity": main.get("humidity"),
+            "pressure": main.get("pressure"),
+            "wind_speed": wind.get("speed"),
+            "timestamp": _time_str(fetched_at),
         }
 
     def _get_weather_mock(self, city_name: str) -> Dict[str, Any]:
@@ -185,23 +575,25 @@ class WeatherService:
             "humidity": 65,
             "pressure": 1013,
             "wind_speed": 3.2,
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "timestamp": _now_str(),
         }
 
 
-def get_location_by_ip() -> Optional[Dict[str, Any]]:
-    try:
-        resp = requests.get("http://ip-api.com/json/", timeout=5)
-        resp.raise_for_status()
-        data = resp.json()
-        if data.get("status") == "success":
-            return {
-                "city": data.get("city") or "Ваш город",
-                "lat": data.get("lat"),
-                "lon": data.get("lon"),
-            }
-        return None
-    except requests.RequestException:
-        return None
+@lru_cache(maxsize=4096)
+def _normalize_city(city_name: str) -> str:
+    # Повторные запросы одного города обходятся поиском в кэше вместо strip/lower
+    if not city_name:
+        return city_name
+    key = city_name.strip().lower()
+    return WeatherService.CITY_ALIASES.get(key, city_name.strip())
 
 
+async def get_location_by_ip(client: httpx.AsyncClient) -> Optional[Dict[str, Any]]:
+    data = await _fetch_json(client, "http://ip-api.com/json/")
+    if data and data.get("status") == "success":
+        return {
+            "city": data.get("city") or "Ваш город",
+            "lat": data.get("lat"),
+            "lon": data.get("lon"),
+        }
+    return None